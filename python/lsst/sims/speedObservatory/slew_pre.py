@@ -42,9 +42,8 @@ class Slewtime_pre(object):
         Slewtimes in seconds. Includes a minimum of 2 seconds because it assumes there was a
         readout started right before slew. Currently does not worry about camera rotation.
         """
-        result = np.empty((2, np.size(alt2)))
-        result[0, :] = self.alt_interpolator(alt1, alt2, grid=False)
-        result[1, :] = self.az_interpolator(az1, az2, grid=False)
-        result = np.max(result, axis=0)
+        alt_time = self.alt_interpolator(alt1, alt2, grid=False)
+        az_time = self.az_interpolator(az1, az2, grid=False)
+        result = np.maximum(alt_time, az_time, out=alt_time).reshape(np.size(alt2))
         return result
 
@@ -1,7 +1,8 @@
-from builtins import zip
 from builtins import object
+import functools
+from collections import namedtuple
 import numpy as np
-from lsst.sims.utils import _hpid2RaDec, _raDec2Hpid, Site, calcLmstLast, _approx_RaDec2AltAz
+from lsst.sims.utils import _hpid2RaDec, Site, calcLmstLast
 import lsst.sims.skybrightness_pre as sb
 import healpy as hp
 import ephem
@@ -20,18 +21,144 @@ __all__ = ['Speed_observatory']
 sec2days = 1./(3600.*24.)
 default_nside = 32
 doff = ephem.Date(0)-ephem.Date('1858/11/17')
+# Resolution to round mjds to when caching sun and moon positions (days, ~9 seconds)
+body_mjd_step = 1e-4
+
+BodyState = namedtuple('BodyState', ['alt', 'az', 'ra', 'dec'])
+filternames = ['u', 'g', 'r', 'i', 'z', 'y']
+# Largest spacing of sky model samples to interpolate twilight times across (days)
+max_twilight_gap = 1./24.
+# Sidereal days per solar day
+sidereal_rate = 1.00273790935
+# Spacing of the grid where the local mean sidereal time gets computed exactly (days)
+lmst_mjd_step = 30.*sec2days
+
+
+@functools.lru_cache(maxsize=4096)
+def _coarse_lmst(mjd_indx, longitude_rad):
+    """
+    Local mean sidereal time (radians) at mjd_indx*lmst_mjd_step
+    """
+    lmst, last = calcLmstLast(mjd_indx*lmst_mjd_step, longitude_rad)
+    return lmst/12.*np.pi
+
+
+# PyEphem objects reused by _body_state, observers are keyed by (lat, lon, elevation)
+_body_observers = {}
+_bodies = {'Sun': ephem.Sun(), 'Moon': ephem.Moon()}
+
+
+@functools.lru_cache(maxsize=4096)
+def _body_state(body_name, mjd_indx, lat, lon, elevation):
+    """
+    Run PyEphem for a body ('Sun' or 'Moon') at mjd_indx*body_mjd_step. PyEphem compute
+    calls are expensive, so these get memoized.
+
+    Returns
+    -------
+    BodyState with the alt, az, ra, dec of the body (radians)
+    """
+    site = (lat, lon, elevation)
+    obs = _body_observers.get(site)
+    if obs is None:
+        obs = ephem.Observer()
+        obs.lat = lat
+        obs.lon = lon
+        obs.elevation = elevation
+        _body_observers[site] = obs
+    obs.date = mjd_indx*body_mjd_step - doff
+    body = _bodies[body_name]
+    body.compute(obs)
+    return BodyState(float(body.alt), float(body.az), float(body.ra), float(body.dec))
+
+
+def _radec2xyz(ra, dec, dtype=np.float64):
+    """
+    Convert ra, dec (radians) to a contiguous (3, N) array of unit vectors
+    """
+    cos_dec = np.cos(dec)
+    return np.ascontiguousarray([cos_dec*np.cos(ra), cos_dec*np.sin(ra), np.sin(dec)], dtype=dtype)
+
+
+@functools.lru_cache(maxsize=8)
+def _horizon_rotation(lat):
+    """
+    Rotation from hour angle frame unit vectors to (north, east, up) at latitude lat (radians)
+    """
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    return np.array([[-sin_lat, 0., cos_lat],
+                     [0., 1., 0.],
+                     [cos_lat, 0., sin_lat]])
+
+
+def _altaz_from_xyz(xyz, lmst, lat):
+    """
+    Convert equatorial unit vectors to altitude and azimuth
+
+    Parameters
+    ----------
+    xyz : np.array
+        (3, N) array of equatorial unit vectors, see _radec2xyz
+    lmst : float
+        Local mean sidereal time (radians)
+    lat : float
+        Latitude of the site (radians)
+
+    Returns
+    -------
+    alt, az (radians), with the same dtype as xyz. Azimuth is measured from north through east.
+    """
+    cos_lmst = np.cos(lmst)
+    sin_lmst = np.sin(lmst)
+    # Rotate the equatorial frame into the hour angle frame
+    ha_rotation = np.array([[cos_lmst, sin_lmst, 0.],
+                            [-sin_lmst, cos_lmst, 0.],
+                            [0., 0., 1.]])
+    rotation = np.dot(_horizon_rotation(lat), ha_rotation).astype(xyz.dtype)
+    neu = np.dot(rotation, xyz)
+    alt = np.arcsin(np.clip(neu[2], -1., 1.))
+    az = np.arctan2(neu[1], neu[0]) % (2.*np.pi)
+    return alt, az
+
+
+def _sun_radec(mjd):
+    """
+    Low precision (~0.01 degree) position of the sun, from the Astronomical Almanac.
+
+    Parameters
+    ----------
+    mjd : float or np.array
+        Modified Julian Date(s)
+
+    Returns
+    -------
+    ra, dec of the sun (radians)
+    """
+    n = mjd - 51544.5
+    mean_lon = np.radians(280.460 + 0.9856474*n)
+    mean_anomaly = np.radians(357.528 + 0.9856003*n)
+    ecliptic_lon = mean_lon + np.radians(1.915)*np.sin(mean_anomaly) + \
+        np.radians(0.020)*np.sin(2.*mean_anomaly)
+    obliquity = np.radians(23.439 - 4e-7*n)
+    ra = np.arctan2(np.cos(obliquity)*np.sin(ecliptic_lon), np.cos(ecliptic_lon))
+    dec = np.arcsin(np.sin(obliquity)*np.sin(ecliptic_lon))
+    return ra, dec
+
+
+def _as_scalar(value):
+    """
+    Return the single value in a scalar or size-1 array (e.g., a field of a one row record)
+    as a python scalar
+    """
+    return np.asarray(value).item()
 
 
 def inrange(inval, minimum=-1., maximum=1.):
     """
     Make sure values are within min/max
     """
-    inval = np.array(inval)
-    below = np.where(inval < minimum)
-    inval[below] = minimum
-    above = np.where(inval > maximum)
-    inval[above] = maximum
-    return inval
+    return np.clip(inval, minimum, maximum)
 
 
 class dummy_time_handler(object):
@@ -136,7 +263,12 @@ class Speed_observatory(object):
         # Set up all sky coordinates
         hpids = np.arange(hp.nside2npix(self.sky_nside))
         self.ra_all_sky, self.dec_all_sky = _hpid2RaDec(self.sky_nside, hpids)
+        # Unit vectors of the all sky coordinates, so alt,az can be found with a single rotation.
+        # Single precision is plenty for slewtime maps.
+        self._xyz_all_sky = _radec2xyz(self.ra_all_sky, self.dec_all_sky, dtype=np.float32)
         self.status = None
+        # Conditions attempt_observe uses, see _status_light
+        self._obs_status = None
 
         self.site = Site(name='LSST')
         self.obs = ephem.Observer()
@@ -147,20 +279,18 @@ class Speed_observatory(object):
         self.obs.horizon = 0.
 
         self.sun = ephem.Sun()
-        self.moon = ephem.Moon()
 
         # Generate sunset times so we can label nights by integers
         self.generate_sunsets()
         self.night = self.mjd2night(self.mjd)
 
         # Make my dummy time handler
-        dth = dummy_time_handler(mjd_start)
+        self._time_handler = dummy_time_handler(mjd_start)
 
         # Make a slewtime interpolator
         self.slew_interp = Slewtime_pre()
 
         # Compute downtimes
-        self.down_nights = []
         if scheduled_downtime is not None:
             sdt = scheduled_downtime
         else:
@@ -173,35 +303,69 @@ class Speed_observatory(object):
             usdt = UnscheduledDowntime()
         usdt.initialize(random_seed=seed)
 
-        for downtime in sdt.downtimes:
-            self.down_nights.extend(range(downtime[0], downtime[0]+downtime[1], 1))
-        for downtime in usdt.downtimes:
-            self.down_nights.extend(range(downtime[0], downtime[0]+downtime[1], 1))
-        self.down_nights.sort()
+        down_nights = [np.arange(downtime[0], downtime[0]+downtime[1])
+                       for downtimes in (sdt.downtimes, usdt.downtimes) for downtime in downtimes]
+        # Sorted array of unique nights the observatory is down
+        self.down_nights = np.unique(np.concatenate(down_nights + [np.array([], dtype=int)]))
+        self._down_nights_set = frozenset(self.down_nights.tolist())
+        self._update_sky_info()
 
-        if seeing_model is not None:
-            self.seeing_model = seeing_model
-        else:
-            self.seeing_model = SeeingSim(dth)
-
-        if cloud_model is not None:
-            self.cloud_model = cloud_model
-        else:
-            self.cloud_model = CloudModel(dth)
-            self.cloud_model.read_data()
+        # The default seeing and cloud models are only built when first used
+        self._seeing_model = seeing_model
+        self._cloud_model = cloud_model
+        # mjd and value of the last cloud lookup
+        self._cloud_mjd = None
+        self._cloud = None
 
         self.cloud_limit = cloud_limit
         self.cloud_step = cloud_step/60./24.
 
+    @property
+    def seeing_model(self):
+        """
+        The seeing model, defaults to SeeingSim
+        """
+        if self._seeing_model is None:
+            self._seeing_model = SeeingSim(self._time_handler)
+        return self._seeing_model
+
+    @seeing_model.setter
+    def seeing_model(self, value):
+        self._seeing_model = value
+
+    @property
+    def cloud_model(self):
+        """
+        The cloud model, defaults to CloudModel
+        """
+        if self._cloud_model is None:
+            self._cloud_model = CloudModel(self._time_handler)
+            self._cloud_model.read_data()
+        return self._cloud_model
+
+    @cloud_model.setter
+    def cloud_model(self, value):
+        self._cloud_model = value
+        self._cloud_mjd = None
+
+    def current_cloud(self):
+        """
+        Cloud value at the current mjd. Cached, since check_mjd and the status updates
+        both ask for it at the same time.
+        """
+        if self._cloud_mjd != self.mjd:
+            delta_t = (self.mjd-self.mjd_start)*24.*3600.
+            self._cloud = self.cloud_model.get_cloud(delta_t)
+            self._cloud_mjd = self.mjd + 0
+        return self._cloud
+
     def slew_time(self, alt, az, mintime=2.):
         """
         Compute slew time to new ra, dec position
         """
 
-        current_alt, current_az = _approx_RaDec2AltAz(np.array([self.ra]),
-                                                      np.array([self.dec]),
-                                                      self.obs.lat, self.obs.lon,
-                                                      self.mjd)
+        current_alt, current_az = _altaz_from_xyz(_radec2xyz(self.ra, self.dec), self._lmst(self.mjd),
+                                                  self.site.latitude_rad)
         # Interpolation can be off by ~.1 seconds if there's no slew.
         if (np.max(current_alt) == np.max(alt)) & (np.max(current_az) == np.max(az)):
             time = mintime
@@ -209,110 +373,185 @@ class Speed_observatory(object):
             time = self.slew_interp(current_alt, current_az, alt, az)
         return time
 
+    def _lmst(self, mjd):
+        """
+        Local mean sidereal time (radians), advanced from the nearest cached grid point
+        """
+        mjd = _as_scalar(mjd)
+        mjd_indx = int(np.floor(mjd/lmst_mjd_step))
+        lmst = _coarse_lmst(mjd_indx, self.site.longitude_rad)
+        return lmst + 2.*np.pi*sidereal_rate*(mjd - mjd_indx*lmst_mjd_step)
+
     def slewtime_map(self):
         """
         Return a map of how long it would take to slew to lots of positions
         """
         if self.ra is None:
             return 0.
-        alt, az = _approx_RaDec2AltAz(self.ra_all_sky, self.dec_all_sky,
-                                      self.obs.lat, self.obs.lon, self.mjd)
-        good = np.where(alt >= self.alt_limit)
-        result = np.empty(self.ra_all_sky.size, dtype=float)
-        result.fill(hp.UNSEEN)
+        alt, az = _altaz_from_xyz(self._xyz_all_sky, self._lmst(self.mjd), self.site.latitude_rad)
+        good = alt >= self.alt_limit
+        result = np.full(alt.size, hp.UNSEEN)
         result[good] = self.slew_time(alt[good], az[good])
         return result
 
+    def _status_light(self):
+        """
+        The parts of the status attempt_observe relies on, without computing the
+        all-sky airmass, brightness, seeing, and slewtime maps. Kept in self._obs_status, while
+        self.status stays the last full status from return_status.
+        """
+        result = {}
+        result['mjd'] = self.mjd
+        result['night'] = self.night
+        result['clouds'] = self.current_cloud()
+        result['filter'] = self.filtername
+        result['RA'] = self.ra
+        result['dec'] = self.dec
+        sunMoon_info = self.sky.returnSunMoon(self.mjd)
+        # Pretty sure these are radians
+        result['sunAlt'] = _as_scalar(sunMoon_info['sunAlt'])
+        result['moonAlt'] = _as_scalar(sunMoon_info['moonAlt'])
+        result['moonRA'] = _as_scalar(sunMoon_info['moonRA'])
+        result['moonDec'] = _as_scalar(sunMoon_info['moonDec'])
+        # I guess go between 0 and 100.
+        result['moonPhase'] = _as_scalar(sunMoon_info['moonSunSep'])/180.*100.
+        self._obs_status = result
+        return result
+
     def return_status(self):
         """
         Return a dict full of the current info about the observatory and sky.
 
         XXX-- Need to document all these with units!!!
         """
-        result = {}
-        result['mjd'] = self.mjd
-        result['night'] = self.night
+        result = self._status_light()
         result['lmst'], last = calcLmstLast(self.mjd, self.site.longitude_rad)
         result['skybrightness'] = self.sky.returnMags(self.mjd)
         result['slewtimes'] = self.slewtime_map()
         result['airmass'] = self.sky.returnAirmass(self.mjd)
         delta_t = (self.mjd-self.mjd_start)*24.*3600.
-        result['clouds'] = self.cloud_model.get_cloud(delta_t)
-        # XXX--can update to pull all filters at once
-        for filtername in ['u', 'g', 'r', 'i', 'z', 'y']:
-            fwhm_500, fwhm_geometric, fwhm_effective = self.seeing_model.get_seeing_singlefilter(delta_t,
-                                                                                                 filtername,
-                                                                                                 result['airmass'])
-            result['FWHMeff_%s' % filtername] = fwhm_effective  # arcsec
-            result['FWHM_geometric_%s' % filtername] = fwhm_geometric
-        result['filter'] = self.filtername
-        result['RA'] = self.ra
-        result['dec'] = self.dec
+        fwhm_geometric, fwhm_effective = self.seeing_maps(delta_t, result['airmass'])
+        for i, filtername in enumerate(filternames):
+            result['FWHMeff_%s' % filtername] = fwhm_effective[i]  # arcsec
+            result['FWHM_geometric_%s' % filtername] = fwhm_geometric[i]
         result['next_twilight_start'] = self.next_twilight_start(self.mjd)
         result['next_twilight_end'] = self.next_twilight_end(self.mjd)
         result['last_twilight_end'] = self.last_twilight_end(self.mjd)
-        sunMoon_info = self.sky.returnSunMoon(self.mjd)
-        # Pretty sure these are radians
-        result['sunAlt'] = np.max(sunMoon_info['sunAlt'])
-        self.obs.date = self.mjd - doff
-        self.moon.compute(self.obs)
-        result['moonAlt'] = np.max(sunMoon_info['moonAlt'])
-        result['moonAz'] = self.moon.az
-        result['moonRA'] = np.max(sunMoon_info['moonRA'])
-        result['moonDec'] = np.max(sunMoon_info['moonDec'])
-        # I guess go between 0 and 100.
-        result['moonPhase'] = np.max(sunMoon_info['moonSunSep']/180.*100.)
+        result['moonAz'] = self.moon_state(self.mjd).az
         self.status = result
         return result
 
+    def seeing_maps(self, delta_t, airmass):
+        """
+        Seeing in all filters for an airmass map
+
+        Parameters
+        ----------
+        delta_t : float
+            Seconds since the start of the simulation
+        airmass : np.array
+            Airmass values, with values below 1 (e.g., hp.UNSEEN) marking invalid pixels
+
+        Returns
+        -------
+        fwhm_geometric, fwhm_effective : np.array
+            Arrays with shape (number of filters, airmass.size), in arcsec. NaN where the
+            airmass is invalid.
+        """
+        airmass = np.asarray(airmass)
+        fwhm_geometric = np.full((len(filternames), airmass.size), np.nan)
+        fwhm_effective = np.full((len(filternames), airmass.size), np.nan)
+        # SeeingSim has no multi-filter call, so this is still one model evaluation per filter.
+        # The only savings is skipping the invalid pixels.
+        good = airmass >= 1.
+        for i, filtername in enumerate(filternames):
+            fwhm_500, fwhm_geometric[i, good], fwhm_effective[i, good] = \
+                self.seeing_model.get_seeing_singlefilter(delta_t, filtername, airmass[good])
+        return fwhm_geometric, fwhm_effective
+
+    def sun_state(self, mjd):
+        """
+        Return the (cached) alt, az, ra, dec of the sun at mjd (radians)
+        """
+        return _body_state('Sun', int(np.round(_as_scalar(mjd)/body_mjd_step)), self.site.latitude_rad,
+                           self.site.longitude_rad, self.site.height)
+
+    def moon_state(self, mjd):
+        """
+        Return the (cached) alt, az, ra, dec of the moon at mjd (radians)
+        """
+        return _body_state('Moon', int(np.round(_as_scalar(mjd)/body_mjd_step)), self.site.latitude_rad,
+                           self.site.longitude_rad, self.site.height)
+
+    def _update_sky_info(self):
+        """
+        Label the loaded sky model samples by night and flag the ones not on down nights
+        """
+        self._sky_info = self.sky.info
+        self.sky.info['night'] = self.mjd2night(self.sky.info['mjds'])
+        self.good_nights = np.isin(self.sky.info['night'], self.down_nights, invert=True)
+        # Sorted sky model times when the sun is down on a good night
+        valid = (self.sky.info['sunAlts'] <= self.sun_limit) & self.good_nights
+        self._valid_mjds = self.sky.info['mjds'][valid]
+        # Label the stretches of the table that have no gaps in them
+        self._sky_segments = np.concatenate([[0], np.cumsum(np.diff(self.sky.info['mjds']) >=
+                                                            max_twilight_gap)])
+        # Twilight times interpolated from the sky model, keyed by twilight altitude limit
+        self._twilight_cache = {}
+
     def check_mjd(self, mjd):
         """
         If an mjd is not in daytime or downtime
         """
 
         # Check if it it too cloudy
-        delta_t = (self.mjd-self.mjd_start)*24.*3600.
-        cloud = self.cloud_model.get_cloud(delta_t)
+        cloud = self.current_cloud()
         if cloud >= self.cloud_limit:
             mjd += self.cloud_step
             return False, mjd
 
-        # Check if self.sky.info has night info, otherwise add it.
-        if 'night' not in self.sky.info.keys():
-            self.sky.info['night'] = self.mjd2night(self.sky.info['mjds'])
-            self.good_nights = np.in1d(self.sky.info['night'], self.down_nights, invert=True)
+        # The sky model swaps in new data when it runs off the end of what is loaded
+        if self.sky.info is not self._sky_info:
+            self._update_sky_info()
 
         # Check if sun is up
-        self.obs.date = mjd - doff
-        self.sun.compute(self.obs)
-        if (self.sun.alt > self.sun_limit) | (self.mjd2night(mjd) in self.down_nights):
-            good = np.where((self.sky.info['mjds'] > mjd) & (self.sky.info['sunAlts'] <= self.sun_limit) &
-                            (self.good_nights))[0]
-            if np.size(good) == 0:
+        if (self.sun_state(mjd).alt > self.sun_limit) | self.night_down(self.mjd2night(mjd)):
+            indx = np.searchsorted(self._valid_mjds, mjd, side='right')
+            if indx >= self._valid_mjds.size:
                 # hack to advance if we are at the end of the mjd list I think
                 mjd += 0.25
             else:
-                mjd = self.sky.info['mjds'][good][0]
+                mjd = self._valid_mjds[indx]
             return False, mjd
         else:
             return True, mjd
 
-    def attempt_observe(self, observation_in, indx=None):
+    def attempt_observe(self, observation_in, indx=None, in_place=False):
         """
         Check an observation, if there is enough time, execute it and return it, otherwise, return None.
+
+        Parameters
+        ----------
+        observation_in : np.array
+            Single row observation record.
+        in_place : bool (False)
+            Fill in observation_in directly rather than a copy of it. Useful when the caller
+            is done with the record and wants to skip the allocation.
         """
+        if in_place:
+            observation = observation_in
+        else:
+            observation = observation_in.copy()
         # If we were in a parked position, assume no time lost to slew, settle, filter change
-        observation = observation_in.copy()
-        alt, az = _approx_RaDec2AltAz(np.array([observation['RA']]),
-                                      np.array([observation['dec']]),
-                                      self.obs.lat, self.obs.lon, self.mjd)
+        alt, az = _altaz_from_xyz(_radec2xyz(observation['RA'], observation['dec']), self._lmst(self.mjd),
+                                  self.site.latitude_rad)
         if self.ra is not None:
             if self.filtername != observation['filter']:
                 ft = self.f_change_time
                 st = 0.
             else:
                 ft = 0.
-                st = self.slew_time(alt, az)
+                st = _as_scalar(self.slew_time(alt, az))
         else:
             st = 0.
             ft = 0.
@@ -320,9 +559,11 @@ class Speed_observatory(object):
         # Assume we can slew while reading the last exposure (note that slewtime calc gives 2 as a minimum. So this 
         # will not fail for DD fields, etc.)
         # So, filter change time, slew to target time, expose time, read time
-        rt = (observation['nexp']-1.)*self.readtime
-        shutter_time = self.shutter_time*observation['nexp']
-        total_time = (ft + st + observation['exptime'] + rt + shutter_time)*sec2days
+        # Pull scalars out of the record so the observatory mjd stays a float
+        nexp = _as_scalar(observation['nexp'])
+        rt = (nexp-1.)*self.readtime
+        shutter_time = self.shutter_time*nexp
+        total_time = (ft + st + _as_scalar(observation['exptime']) + rt + shutter_time)*sec2days
         check_result, jump_mjd = self.check_mjd(self.mjd + total_time)
         if check_result:
             # XXX--major decision here, should the status be updated after every observation? Or just assume
@@ -332,27 +573,36 @@ class Speed_observatory(object):
             else:
                 update_status = False
             # This should be the start of the exposure.
-            observation['mjd'] = self.mjd + (ft + st)*sec2days
-            self.set_mjd(self.mjd + (ft + st)*sec2days)
-            self.ra = observation['RA']
-            self.dec = observation['dec']
+            start_mjd = self.mjd + (ft + st)*sec2days
+            observation['mjd'] = start_mjd
+            # Keep our own copy of the pointing, the record may belong to (and be reused by) the caller
+            self.ra = _as_scalar(observation['RA'])
+            self.dec = _as_scalar(observation['dec'])
 
             if update_status:
-                # What's the name for temp variables?
-                status = self.return_status()
+                # Parked, so there was no slew or filter change and self.mjd is the exposure start
+                self._status_light()
 
-            observation['night'] = self.night
+            if ft + st == 0:
+                # The exposure starts now, so we already know the night
+                observation['night'] = self.night
+            else:
+                observation['night'] = self.mjd2night(start_mjd)
             # XXX I REALLY HATE THIS! READTIME SHOULD NOT BE LUMPED IN WITH SLEWTIME!
             # XXX--removing that so I may not be using the same convention as opsim.
             observation['slewtime'] = ft+st
 
             self.filtername = observation['filter'][0]
-            hpid = _raDec2Hpid(self.sky_nside, self.ra, self.dec)
-            observation['skybrightness'] = self.sky.returnMags(observation['mjd'], indx=[hpid],
+            hpid = int(hp.ang2pix(self.sky_nside, np.pi/2. - self.dec, self.ra))
+            observation['skybrightness'] = self.sky.returnMags(start_mjd, indx=[hpid],
                                                                extrapolate=True)[self.filtername]
-            observation['FWHMeff'] = self.status['FWHMeff_%s' % self.filtername][hpid]
-            observation['FWHM_geometric'] = self.status['FWHM_geometric_%s' % self.filtername][hpid]
-            observation['airmass'] = self.status['airmass'][hpid]
+            # Airmass and seeing as of the last status update, but only at the observed position
+            observation['airmass'] = _as_scalar(self.sky.returnAirmass(self._obs_status['mjd'], indx=[hpid]))
+            delta_t = (self._obs_status['mjd']-self.mjd_start)*24.*3600.
+            fwhm_500, fwhm_geometric, fwhm_effective = \
+                self.seeing_model.get_seeing_singlefilter(delta_t, self.filtername, observation['airmass'])
+            observation['FWHMeff'] = fwhm_effective
+            observation['FWHM_geometric'] = fwhm_geometric
             observation['fivesigmadepth'] = m5_flat_sed(observation['filter'][0],
                                                         observation['skybrightness'],
                                                         observation['FWHMeff'],
@@ -360,11 +610,10 @@ class Speed_observatory(object):
                                                         observation['airmass'])
             observation['alt'] = alt
             observation['az'] = az
-            observation['clouds'] = self.status['clouds']
-            observation['sunAlt'] = self.status['sunAlt']
-            observation['moonAlt'] = self.status['moonAlt']
-            # We had advanced the slew and filter change, so subtract that off and add the total visit time.
-            self.set_mjd(self.mjd + total_time - (ft + st)*sec2days)
+            observation['clouds'] = self._obs_status['clouds']
+            observation['sunAlt'] = self._obs_status['sunAlt']
+            observation['moonAlt'] = self._obs_status['moonAlt']
+            self.set_mjd(self.mjd + total_time)
 
             return observation
         else:
@@ -373,62 +622,163 @@ class Speed_observatory(object):
             self.ra = None
             self.dec = None
             self.status = None
+            self._obs_status = None
             self.filtername = None
             return None
 
-    def generate_sunsets(self, nyears=13, day_pad=50):
-        """
-        Generate the sunrise times for LSST so we can label nights by MJD
+    def generate_sunsets(self, nyears=13, day_pad=50, horizon=-34./60.):
         """
+        Generate the sunset times for LSST so we can label nights by MJD
 
-        # Set observatory horizon to zero
-        self.obs.horizon = 0.
-
+        Parameters
+        ----------
+        nyears : int (13)
+            Number of years to compute sunsets for.
+        day_pad : int (50)
+            Extra days to pad onto the end.
+        horizon : float (-34./60.)
+            Altitude of the center of the sun at sunset (degrees). The default
+            matches PyEphem's horizon of zero with standard refraction.
+        """
         # Swipe dates to match sims_skybrightness_pre365
         mjd_start = self.mjd
         mjd_end = np.arange(59560, 59560+365.25*nyears+day_pad+366, 366).max()
-        step = 0.25
-        mjds = np.arange(mjd_start, mjd_end+step, step)
-        setting = mjds*0.
-
-        # Stupid Dublin Julian Date
-        djds = mjds - doff
-        sun = ephem.Sun()
-
-        for i, (mjd, djd) in enumerate(zip(mjds, djds)):
-            sun.compute(djd)
-            setting[i] = self.obs.previous_setting(sun, start=djd, use_center=True)
-        setting = setting + doff
-
-        # zomg, round off crazy floating point precision issues
-        setting_rough = np.round(setting*100.)
-        u, indx = np.unique(setting_rough, return_index=True)
-        self.setting_sun_mjds = setting[indx]
-        left = np.searchsorted(self.setting_sun_mjds, mjd_start)
-        self.setting_sun_mjds = self.setting_sun_mjds[left:]
+        lat = self.site.latitude_rad
+        lon = self.site.longitude_rad
+
+        # Start from local noon on each day and refine to the meridian transit of the sun
+        days = np.arange(np.floor(mjd_start)-1, mjd_end+1)
+        transit = days + 0.5 - lon/(2.*np.pi)
+        for i in range(2):
+            ra, dec = _sun_radec(transit)
+            lmst, last = calcLmstLast(transit, lon)
+            ha = lmst/12.*np.pi - ra
+            ha = (ha + np.pi) % (2.*np.pi) - np.pi
+            transit -= ha/(2.*np.pi)
+
+        # Hour angle when the sun reaches the horizon, re-evaluating the declination at sunset
+        setting = transit + 0.25
+        for i in range(2):
+            ra, dec = _sun_radec(setting)
+            cos_ha = (np.sin(np.radians(horizon)) - np.sin(lat)*np.sin(dec))/(np.cos(lat)*np.cos(dec))
+            setting = transit + np.arccos(np.clip(cos_ha, -1., 1.))/(2.*np.pi)
+
+        # One sunset per day, already sorted. Start with the first one after mjd_start.
+        left = np.searchsorted(setting, mjd_start)
+        self.setting_sun_mjds = setting[left:]
         self.setting_sun_nights = self.mjd2night(self.setting_sun_mjds)
+        # Last night found by mjd2night
+        self._night_cursor = 0
+
+    def _twilight_crossings(self, twi_limit):
+        """
+        Times the sun rises and sets through twi_limit (degrees), interpolated from
+        the sun altitudes tabulated in the loaded sky model.
+
+        Returns
+        -------
+        dict with 'rising' and 'setting' keys, each holding the crossing mjds and the
+        gap-free segment of the sky model table each crossing falls in.
+        """
+        if self.sky.info is not self._sky_info:
+            self._update_sky_info()
+        if twi_limit not in self._twilight_cache:
+            mjds = self.sky.info['mjds']
+            sun_alts = self.sky.info['sunAlts']
+            limit = np.radians(twi_limit)
+            below = sun_alts <= limit
+            # Only trust crossings between neighboring samples, not across gaps in the table
+            close = np.diff(mjds) < max_twilight_gap
+            crossings = {}
+            for key, indx in (('rising', np.where(below[:-1] & ~below[1:] & close)[0]),
+                              ('setting', np.where(~below[:-1] & below[1:] & close)[0])):
+                frac = (limit - sun_alts[indx])/(sun_alts[indx+1] - sun_alts[indx])
+                crossings[key] = (mjds[indx] + frac*(mjds[indx+1] - mjds[indx]),
+                                  self._sky_segments[indx])
+            self._twilight_cache[twi_limit] = crossings
+        return self._twilight_cache[twi_limit]
+
+    def _sky_segment(self, mjd):
+        """
+        The gap-free segment of the loaded sky model table an mjd falls in, None if it is
+        outside the table or in a gap.
+        """
+        mjds = self.sky.info['mjds']
+        indx = np.searchsorted(mjds, mjd, side='right') - 1
+        if (indx < 0) or (mjd > mjds[-1]):
+            return None
+        if (indx < mjds.size-1) and (mjds[indx+1] - mjds[indx] >= max_twilight_gap):
+            return None
+        return self._sky_segments[indx]
+
+    def _table_twilight(self, mjd, twi_limit, key, after):
+        """
+        Look up the next (after=True) or previous rising or setting (key) twilight from
+        the sky model table. Returns None when the table can not be trusted for it, i.e.,
+        when mjd and the crossing are not in the same gap-free stretch of the table.
+        """
+        crossings, segments = self._twilight_crossings(twi_limit)[key]
+        segment = self._sky_segment(mjd)
+        if segment is None:
+            return None
+        if after:
+            indx = np.searchsorted(crossings, mjd, side='right')
+        else:
+            indx = np.searchsorted(crossings, mjd) - 1
+        if (indx < 0) or (indx >= crossings.size):
+            return None
+        # Each of these events happens within a day, so anything further means one was missed
+        if (segments[indx] != segment) or (np.abs(crossings[indx] - mjd) > 1.):
+            return None
+        return crossings[indx]
 
     def next_twilight_start(self, mjd, twi_limit=-18.):
-        # find the next rising twilight. String to make it degrees I guess?
-        self.obs.horizon = str(twi_limit)
-        next_twi = self.obs.next_rising(self.sun, start=mjd-doff)+doff
+        # find the next rising twilight.
+        next_twi = self._table_twilight(mjd, twi_limit, 'rising', True)
+        if next_twi is None:
+            # Fall back to PyEphem. String to make it degrees I guess?
+            self.obs.horizon = str(twi_limit)
+            next_twi = self.obs.next_rising(self.sun, start=mjd-doff)+doff
         return next_twi
 
     def next_twilight_end(self, mjd, twi_limit=-18.):
-        self.obs.horizon = str(twi_limit)
-        next_twi = self.obs.next_setting(self.sun, start=mjd-doff)+doff
+        next_twi = self._table_twilight(mjd, twi_limit, 'setting', True)
+        if next_twi is None:
+            self.obs.horizon = str(twi_limit)
+            next_twi = self.obs.next_setting(self.sun, start=mjd-doff)+doff
         return next_twi
 
     def last_twilight_end(self, mjd, twi_limit=-18.):
-        self.obs.horizon = str(twi_limit)
-        next_twi = self.obs.previous_setting(self.sun, start=mjd-doff)+doff
+        next_twi = self._table_twilight(mjd, twi_limit, 'setting', False)
+        if next_twi is None:
+            self.obs.horizon = str(twi_limit)
+            next_twi = self.obs.previous_setting(self.sun, start=mjd-doff)+doff
         return next_twi
 
+    def night_down(self, night):
+        """
+        Check if the observatory is down on a night. For an array of nights, True if any are down.
+        """
+        if np.ndim(night) > 0:
+            return bool(np.any(np.isin(night, self.down_nights)))
+        return night in self._down_nights_set
+
     def mjd2night(self, mjd):
         """
         Convert an mjd to a night integer.
         """
-        return np.searchsorted(self.setting_sun_mjds, mjd)
+        if np.ndim(mjd) > 0:
+            return np.searchsorted(self.setting_sun_mjds, mjd)
+        # Time mostly moves forward, so check the night we were on last and the one after first
+        cursor = self._night_cursor
+        n_sets = self.setting_sun_mjds.size
+        for night in range(cursor, min(cursor+2, n_sets+1)):
+            if (night == 0 or self.setting_sun_mjds[night-1] < mjd) and \
+               (night == n_sets or mjd <= self.setting_sun_mjds[night]):
+                self._night_cursor = night
+                return night
+        self._night_cursor = np.searchsorted(self.setting_sun_mjds, mjd)
+        return self._night_cursor
 
     def set_mjd(self, mjd):
         """
@@ -1,6 +1,10 @@
 import numpy as np
 import unittest
+import ephem
+import healpy as hp
 import lsst.sims.speedObservatory as speedo
+from lsst.sims.speedObservatory.speed_observatory import _altaz_from_xyz, _radec2xyz
+from lsst.sims.utils import _approx_RaDec2AltAz
 import lsst.utils.tests
 
 
@@ -38,6 +42,164 @@ class TestSpeedObs(unittest.TestCase):
         result = so.attempt_observe(obs)
 
         assert(result['airmass'] >= 1.)
+        # The observatory clock and pointing should stay scalars
+        assert(np.ndim(so.mjd) == 0)
+        assert(np.ndim(so.ra) == 0)
+        assert(np.ndim(so.dec) == 0)
+
+    def test_in_place(self):
+        so = speedo.Speed_observatory()
+        obs = test_obs()
+        obs['dec'] = np.radians(-30.)
+        obs['filter'] = 'r'
+        obs['exptime'] = 30.
+        obs['nexp'] = 2
+        original = obs.copy()
+        # Keep trying until the observatory is open
+        for i in range(100):
+            result = so.attempt_observe(obs)
+            if result is not None:
+                break
+        assert(result is not None)
+        # By default the input record is left alone
+        assert(result is not obs)
+        assert(np.all(obs == original))
+        assert(result['mjd'] > 0)
+
+        obs['dec'] = np.radians(-35.)
+        for i in range(100):
+            result = so.attempt_observe(obs, in_place=True)
+            if result is not None:
+                break
+        # in_place fills in and returns the same record
+        assert(result is obs)
+        assert(obs['mjd'] > 0)
+        assert(obs['airmass'] >= 1.)
+        # Reusing the record for the next target should not move the telescope
+        ra, dec = so.ra, so.dec
+        obs['RA'] = ra + 0.5
+        obs['dec'] = dec + 0.1
+        self.assertEqual(so.ra, ra)
+        self.assertEqual(so.dec, dec)
+
+    def test_altaz(self):
+        so = speedo.Speed_observatory()
+        lat = so.site.latitude_rad
+        rng = np.random.RandomState(42)
+        ra = rng.uniform(0., 2.*np.pi, size=1000)
+        dec = np.arcsin(rng.uniform(-1., 1., size=1000))
+        for mjd in so.mjd + np.array([0., 0.3172, 17.81, 1234.567]):
+            lmst = so._lmst(mjd)
+            # Points on the northern meridian and just to either side land at az near 0 and 2pi
+            ra_test = np.concatenate([ra, (lmst + np.array([0., 1e-3, -1e-3])) % (2.*np.pi)])
+            dec_test = np.concatenate([dec, np.zeros(3)])
+            alt, az = _altaz_from_xyz(_radec2xyz(ra_test, dec_test), lmst, lat)
+            alt_approx, az_approx = _approx_RaDec2AltAz(ra_test, dec_test, lat, so.site.longitude_rad, mjd)
+            # Agree to ~20 arcsec
+            tol = 1e-4
+            np.testing.assert_allclose(alt, alt_approx, rtol=0, atol=tol)
+            assert((az.min() >= 0.) & (az.max() < 2.*np.pi))
+            assert((az[-3] < tol) | (az[-3] > 2.*np.pi - tol))
+            assert(az[-2] < 0.1)
+            assert(az[-1] > 2.*np.pi - 0.1)
+            # Compare azimuths around the circle, azimuth is ill-defined at the zenith
+            daz = (az - az_approx + np.pi) % (2.*np.pi) - np.pi
+            not_zenith = alt_approx < np.radians(89.)
+            assert(np.max(np.abs(daz[not_zenith])) < tol)
+
+    def test_seeing_maps(self):
+        so = speedo.Speed_observatory()
+        airmass = so.sky.returnAirmass(so.mjd)
+        bad = airmass == hp.UNSEEN
+        assert(np.any(bad) & np.any(~bad))
+        delta_t = 3600.
+        fwhm_geometric, fwhm_effective = so.seeing_maps(delta_t, airmass)
+        # Should match calling the seeing model filter by filter
+        for i, filtername in enumerate(speedo.speed_observatory.filternames):
+            fwhm_500, fwhm_geom, fwhm_eff = so.seeing_model.get_seeing_singlefilter(delta_t, filtername,
+                                                                                     airmass[~bad])
+            np.testing.assert_allclose(fwhm_geometric[i, ~bad], fwhm_geom)
+            np.testing.assert_allclose(fwhm_effective[i, ~bad], fwhm_eff)
+            assert(np.all(np.isnan(fwhm_geometric[i, bad])))
+            assert(np.all(np.isnan(fwhm_effective[i, bad])))
+
+    def test_sunsets(self):
+        so = speedo.Speed_observatory()
+        # One sunset per day
+        days = np.diff(so.setting_sun_mjds)
+        assert((days.min() > 0.95) & (days.max() < 1.05))
+
+        # Compare a sample of days across the full span to PyEphem. The low precision
+        # solar position should put sunset within 2 minutes.
+        tol = 2./60./24.
+        obs = ephem.Observer()
+        obs.lat = so.site.latitude_rad
+        obs.lon = so.site.longitude_rad
+        obs.elevation = so.site.height
+        obs.horizon = 0.
+        sun = ephem.Sun()
+        doff = ephem.Date(0)-ephem.Date('1858/11/17')
+        for mjd in so.setting_sun_mjds[::73]:
+            # Look back for the setting from a few hours after the computed one
+            djd = mjd + 0.2 - doff
+            sun.compute(djd)
+            ephem_setting = obs.previous_setting(sun, start=djd, use_center=True) + doff
+            assert(np.abs(ephem_setting - mjd) < tol)
+
+    def test_twilight(self):
+        so = speedo.Speed_observatory()
+        # Twilight times from the sky model table should match PyEphem
+        tol = 2./60./24.
+        obs = ephem.Observer()
+        obs.lat = so.site.latitude_rad
+        obs.lon = so.site.longitude_rad
+        obs.elevation = so.site.height
+        sun = ephem.Sun()
+        doff = ephem.Date(0)-ephem.Date('1858/11/17')
+        # Dark times inside the loaded sky model
+        mjds = so.sky.info['mjds'][so.sky.info['sunAlts'] < np.radians(-20.)]
+        mjds = mjds[::max(mjds.size // 20, 1)]
+        assert(mjds.size > 0)
+        # -5 degrees is above where the sky model is computed, so it exercises the PyEphem fallback
+        for twi_limit in [-18., -5.]:
+            obs.horizon = str(twi_limit)
+            for mjd in mjds:
+                djd = mjd - doff
+                assert(np.abs(so.next_twilight_start(mjd, twi_limit=twi_limit) -
+                              (obs.next_rising(sun, start=djd) + doff)) < tol)
+                assert(np.abs(so.next_twilight_end(mjd, twi_limit=twi_limit) -
+                              (obs.next_setting(sun, start=djd) + doff)) < tol)
+                assert(np.abs(so.last_twilight_end(mjd, twi_limit=twi_limit) -
+                              (obs.previous_setting(sun, start=djd) + doff)) < tol)
+
+    def test_night_down(self):
+        so = speedo.Speed_observatory()
+        up_nights = np.setdiff1d(np.arange(so.setting_sun_nights.max()), so.down_nights)
+        assert(so.down_nights.size > 0)
+        # Scalar nights, both python and numpy ints
+        assert(so.night_down(so.down_nights[0]))
+        assert(so.night_down(int(so.down_nights[0])))
+        assert(not so.night_down(up_nights[0]))
+        assert(not so.night_down(int(up_nights[0])))
+        # Arrays of nights
+        assert(so.night_down(np.array([up_nights[0], so.down_nights[0]])))
+        assert(not so.night_down(up_nights[:3]))
+        # check_mjd hands it the night of a scalar mjd
+        assert(np.ndim(so.mjd2night(so.mjd)) == 0)
+
+    def test_mjd2night(self):
+        so = speedo.Speed_observatory()
+        # Step forward through several nights, jump ahead, then step backwards
+        mjds = so.setting_sun_mjds[0] + np.arange(0., 5., 0.1)
+        mjds = np.concatenate([mjds, [mjds[-1] + 100.3, mjds[-1] + 99.8, mjds[-1] + 99.7]])
+        # Land exactly on a sunset too
+        mjds = np.concatenate([mjds, so.setting_sun_mjds[200:202]])
+        for mjd in mjds:
+            night = so.mjd2night(mjd)
+            assert(np.ndim(night) == 0)
+            self.assertEqual(night, np.searchsorted(so.setting_sun_mjds, mjd))
+        # Arrays go through searchsorted
+        np.testing.assert_array_equal(so.mjd2night(mjds), np.searchsorted(so.setting_sun_mjds, mjds))
 
 
 class TestMemory(lsst.utils.tests.MemoryTestCase):